@@ -3,25 +3,51 @@ projtools provides a set of tools for dealing with different coordinate referenc
 """
 from __future__ import annotations
 
+import concurrent.futures
+import functools
+import os
 from collections import abc
 from math import ceil, floor
+from typing import Callable
 
 import geopandas as gpd
 import numpy as np
 import pyproj
 import rasterio as rio
-import shapely.ops
+import shapely
 from rasterio.crs import CRS
 from shapely.geometry.base import BaseGeometry
 from shapely.geometry.polygon import Polygon
 
 
-def latlon_to_utm(lat: float, lon: float) -> str:
+@functools.lru_cache(maxsize=None)
+def _get_utm_zones() -> list[tuple[float, float, float, float, str]]:
+    """
+    Get the area of use of all WGS 84 UTM zones from the PROJ database, queried only once.
+
+    :returns: List of UTM zones as (west, south, east, north, zone).
+    """
+    utm_crs_infos = pyproj.database.query_utm_crs_info(
+        "WGS 84", area_of_interest=pyproj.aoi.AreaOfInterest(-180, -90, 180, 90)
+    )
+
+    utm_zones = []
+    for info in utm_crs_infos:
+        area = info.area_of_use
+        if area is not None:
+            utm_zones.append((area.west, area.south, area.east, area.north, info.name.split(" ")[-1]))
+
+    return utm_zones
+
+
+def latlon_to_utm(lat: float, lon: float, use_proj_db: bool = False) -> str:
     """
     Get UTM zone for a given latitude and longitude coordinates.
 
     :param lat: Latitude coordinate.
     :param lon: Longitude coordinate.
+    :param use_proj_db: Whether to query the UTM zone in the PROJ database instead of computing it from the \
+        longitude, much slower.
 
     :returns: UTM zone.
     """
@@ -37,12 +63,47 @@ def latlon_to_utm(lat: float, lon: float) -> str:
     if not -90 <= lat < 90:
         raise ValueError("Latitude value is out of range [-90, 90[.")
 
-    # Get UTM zone from name string of crs info
-    utm_zone = pyproj.database.query_utm_crs_info(
-        "WGS 84", area_of_interest=pyproj.aoi.AreaOfInterest(lon, lat, lon, lat)
-    )[0].name.split(" ")[-1]
+    if use_proj_db:
+        # Get UTM zone from the first area of use of the PROJ database that contains the coordinates
+        for west, south, east, north, utm_zone in _get_utm_zones():
+            if west <= lon <= east and south <= lat <= north:
+                return utm_zone
+        raise ValueError(f"No UTM zone found in the PROJ database for latitude {lat} and longitude {lon}.")
+
+    # UTM zones are 6° wide starting from -180°, and the hemisphere is given by the sign of the latitude
+    zone = int((lon + 180) // 6) + 1
+    hemisphere = "N" if lat >= 0 else "S"
+
+    return f"{zone}{hemisphere}"
+
+
+def latlon_to_utm_array(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    Get UTM zones for arrays of latitude and longitude coordinates, see latlon_to_utm.
+
+    :param lats: Latitude coordinates.
+    :param lons: Longitude coordinates.
+
+    :returns: UTM zones, array of strings of the same shape as the coordinates.
+    """
+
+    lats = np.asarray(lats)
+    lons = np.asarray(lons)
+
+    if not (np.issubdtype(lats.dtype, np.number) and np.issubdtype(lons.dtype, np.number)):
+        raise TypeError("Latitudes and longitudes must be floats or integers.")
+
+    # Check that values are in range, rather than out of range, for NaNs to fail the check
+    if not np.all((lons >= -180) & (lons < 180)):
+        raise ValueError("Longitude values are out of range [-180, 180[.")
+    if not np.all((lats >= -90) & (lats < 90)):
+        raise ValueError("Latitude values are out of range [-90, 90[.")
 
-    return str(utm_zone)
+    # UTM zones are 6° wide starting from -180°, and the hemisphere is given by the sign of the latitude
+    zones = ((lons + 180) // 6).astype(int) + 1
+    hemispheres = np.where(lats >= 0, "N", "S")
+
+    return np.char.add(zones.astype(str), hemispheres)
 
 
 def utm_to_epsg(utm: str) -> int:
@@ -54,50 +115,91 @@ def utm_to_epsg(utm: str) -> int:
     :return: EPSG of UTM zone.
     """
 
-    # Whether UTM is passed as single or double digits, homogenize to single-digit
-    utm = str(int(utm[:-1])) + utm[-1].upper()
+    if not isinstance(utm, str):
+        raise TypeError("UTM zone must be a string.")
 
-    # Get corresponding EPSG
-    epsg = pyproj.CRS(f"WGS 84 / UTM Zone {utm}").to_epsg()
+    # Whether UTM is passed as single or double digits, or lower-case, the zone number and hemisphere are the same
+    try:
+        zone = int(utm[:-1])
+        hemisphere = utm[-1].upper()
+    except (ValueError, IndexError):
+        raise pyproj.exceptions.CRSError(f"Invalid UTM zone: {utm}.")
+    if not 1 <= zone <= 60 or hemisphere not in ["N", "S"]:
+        raise pyproj.exceptions.CRSError(f"Invalid UTM zone: {utm}.")
 
-    return int(epsg)
+    # Get corresponding EPSG of WGS 84 / UTM zone: 326XX for the north, 327XX for the south
+    epsg = (32600 if hemisphere == "N" else 32700) + zone
 
+    return epsg
 
-def bounds2poly(
+
+def _extract_bounds(
     boundsGeom: list[float] | rio.io.DatasetReader,
     in_crs: CRS | None = None,
     out_crs: CRS | None = None,
-) -> Polygon:
+) -> tuple[float, float, float, float]:
     """
-    Converts self's bounds into a shapely Polygon. Optionally, returns it into a different CRS.
+    Extract the bounds coordinates of any geometry with bounds. Optionally, returns them into a different CRS.
 
     :param boundsGeom: A geometry with bounds. Can be either a list of coordinates (xmin, ymin, xmax, ymax),\
             a rasterio/Raster object, a geoPandas/Vector object
     :param in_crs: Input CRS
     :param out_crs: Output CRS
 
-    :returns: Output polygon
+    :returns: Output bounds (xmin, ymin, xmax, ymax)
     """
-    # If boundsGeom is a GeoPandas or Vector object (warning, has both total_bounds and bounds attributes)
-    if hasattr(boundsGeom, "total_bounds"):
+    # If boundsGeom is a GeoPandas object (warning, has both total_bounds and bounds attributes)
+    if isinstance(boundsGeom, (gpd.GeoDataFrame, gpd.GeoSeries)):
+        xmin, ymin, xmax, ymax = boundsGeom.total_bounds
+        in_crs = boundsGeom.crs
+    # If boundsGeom is a rasterio dataset
+    elif isinstance(boundsGeom, rio.io.DatasetReader):
+        xmin, ymin, xmax, ymax = boundsGeom.bounds
+        in_crs = boundsGeom.crs
+    # If a list of coordinates, or a rasterio BoundingBox
+    elif isinstance(boundsGeom, (list, tuple)):
+        xmin, ymin, xmax, ymax = boundsGeom
+    # Otherwise, check the attributes, e.g. for a Vector object (has both total_bounds and bounds attributes)
+    elif hasattr(boundsGeom, "total_bounds"):
         xmin, ymin, xmax, ymax = boundsGeom.total_bounds  # type: ignore
         in_crs = boundsGeom.crs  # type: ignore
-    # If boundsGeom is a rasterio or Raster object
+    # Or for a Raster object
     elif hasattr(boundsGeom, "bounds"):
         xmin, ymin, xmax, ymax = boundsGeom.bounds  # type: ignore
         in_crs = boundsGeom.crs  # type: ignore
-    # if a list of coordinates
-    elif isinstance(boundsGeom, (list, tuple)):
-        xmin, ymin, xmax, ymax = boundsGeom
     else:
         raise ValueError(
             "boundsGeom must a list/tuple of coordinates or an object with attributes bounds or total_bounds."
         )
 
-    corners = ((xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax))
-
+    # Reproject the bounds, densifying the edges to get the envelope of the bounds in the output CRS
+    # (this is skipped if the CRSs are the same)
     if (in_crs is not None) & (out_crs is not None):
-        corners = np.transpose(reproject_points(np.transpose(corners), in_crs, out_crs))
+        xmin, ymin, xmax, ymax = _get_bounds_projected(
+            rio.coords.BoundingBox(xmin, ymin, xmax, ymax), in_crs=in_crs, out_crs=out_crs, densify_pts=21
+        )
+
+    return (xmin, ymin, xmax, ymax)
+
+
+def bounds2poly(
+    boundsGeom: list[float] | rio.io.DatasetReader,
+    in_crs: CRS | None = None,
+    out_crs: CRS | None = None,
+) -> Polygon:
+    """
+    Converts self's bounds into a shapely Polygon. Optionally, returns it into a different CRS.
+
+    :param boundsGeom: A geometry with bounds. Can be either a list of coordinates (xmin, ymin, xmax, ymax),\
+            a rasterio/Raster object, a geoPandas/Vector object
+    :param in_crs: Input CRS
+    :param out_crs: Output CRS
+
+    :returns: Output polygon
+    """
+    xmin, ymin, xmax, ymax = _extract_bounds(boundsGeom, in_crs=in_crs, out_crs=out_crs)
+
+    corners = ((xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax))
 
     bbox = Polygon(corners)
 
@@ -121,33 +223,44 @@ def merge_bounds(
     :param merging_algorithm: Algorithm to use for merging, either "union" or "intersection".
     :param return_rio_bbox: Whether to return a rio.coords.BoundingBox object instead of a tuple.
 
-    :returns: Output bounds (xmin, ymin, xmax, ymax) or empty tuple
+    :returns: Output bounds (xmin, ymin, xmax, ymax), or NaNs if the intersection is void
     """
     # Check that bounds_list is a list of bounds objects
     assert isinstance(bounds_list, (list, tuple)), "bounds_list must be a list/tuple"
 
-    for bounds in bounds_list:
-        assert hasattr(bounds, "bounds") or hasattr(bounds, "total_bounds") or isinstance(bounds, (list, tuple)), (
-            "bounds_list must be a list of lists/tuples of coordinates or an object with attributes bounds "
-            "or total_bounds"
-        )
+    if merging_algorithm not in ["union", "intersection"]:
+        raise ValueError("merging_algorithm must be 'union' or 'intersection'")
 
-    output_poly = bounds2poly(boundsGeom=bounds_list[0])
-
-    # Compute the merging
-    for boundsGeom in bounds_list[1:]:
-        new_poly = bounds2poly(boundsGeom)
-
-        if merging_algorithm == "union":
-            output_poly = output_poly.union(new_poly)
-        elif merging_algorithm == "intersection":
-            output_poly = output_poly.intersection(new_poly)
-        else:
-            raise ValueError("merging_algorithm must be 'union' or 'intersection'")
+    # Get the coordinates of all bounds, in a single array of shape (N, 4)
+    # If all bounds are already coordinates (including rasterio BoundingBoxes), convert them directly
+    if all(isinstance(bounds, (list, tuple)) for bounds in bounds_list):
+        all_bounds = np.array(bounds_list, dtype=np.float64)
+    else:
+        all_bounds = np.array([_extract_bounds(boundsGeom) for boundsGeom in bounds_list], dtype=np.float64)
+
+    assert all_bounds.ndim == 2 and all_bounds.shape[1] == 4, "bounds must have 4 coordinates (xmin, ymin, xmax, ymax)"
+    # Sort the coordinates of each bounds, as those can be inverted (e.g., bottom > top for a south-up raster)
+    lefts = np.minimum(all_bounds[:, 0], all_bounds[:, 2])
+    rights = np.maximum(all_bounds[:, 0], all_bounds[:, 2])
+    bottoms = np.minimum(all_bounds[:, 1], all_bounds[:, 3])
+    tops = np.maximum(all_bounds[:, 1], all_bounds[:, 3])
+
+    # Compute the merging, bounds being axis-aligned there is no need to compute the polygon union/intersection
+    if merging_algorithm == "union":
+        new_bounds = (lefts.min(), bottoms.min(), rights.max(), tops.max())
+    else:
+        new_bounds = (lefts.max(), bottoms.max(), rights.min(), tops.min())
+        # If the intersection is void, return NaNs
+        if new_bounds[0] > new_bounds[2] or new_bounds[1] > new_bounds[3]:
+            new_bounds = (np.nan, np.nan, np.nan, np.nan)
 
     # Get merged bounds, write as dict to manipulate with resolution in the next step
-    new_bounds = output_poly.bounds
-    rio_bounds = {"left": new_bounds[0], "bottom": new_bounds[1], "right": new_bounds[2], "top": new_bounds[3]}
+    rio_bounds = {
+        "left": float(new_bounds[0]),
+        "bottom": float(new_bounds[1]),
+        "right": float(new_bounds[2]),
+        "top": float(new_bounds[3]),
+    }
 
     # Make sure that extent is a multiple of resolution
     if resolution is not None:
@@ -194,21 +307,146 @@ def align_bounds(
     return (left, bottom, right, top)
 
 
-def reproject_points(pts: list[list[float]] | np.ndarray, in_crs: CRS, out_crs: CRS) -> tuple[list[float], list[float]]:
+def align_bounds_batch(ref_transform: rio.transform.Affine, src_bounds: np.ndarray) -> np.ndarray:
+    """
+    Aligns several bounds at once so that they match the georeferences in ref_transform, see align_bounds.
+
+    :param ref_transform: The transform of the dataset to be used as reference
+    :param src_bounds: The initial bounds that need to be aligned to ref_transform. \
+    Must be an array of shape (N, 4) with coordinates (left, bottom, right, top) for each row.
+
+    :returns: the aligned bounding boxes, array of shape (N, 4) with coordinates (left, bottom, right, top)
+    """
+    src_bounds = np.asarray(src_bounds, dtype=np.float64)
+    assert src_bounds.ndim == 2 and src_bounds.shape[1] == 4, "src_bounds must be of shape (N, 4)"
+
+    xres = ref_transform.a
+    yres = ref_transform.e
+    ref_left = ref_transform.xoff
+    ref_top = ref_transform.yoff
+
+    left = ref_left + np.floor((src_bounds[:, 0] - ref_left) / xres) * xres
+    right = left + np.ceil((src_bounds[:, 2] - left) / xres) * xres
+    top = ref_top + np.floor((src_bounds[:, 3] - ref_top) / yres) * yres
+    bottom = top + np.ceil((src_bounds[:, 1] - top) / yres) * yres
+
+    return np.stack([left, bottom, right, top], axis=1)
+
+
+def _crs_to_wkt(crs: CRS | pyproj.CRS | str | int) -> str:
+    """
+    Normalize a CRS into its WKT string, to be used as a hashable cache key.
+
+    :param crs: CRS, as a rasterio or pyproj CRS, or any input accepted by pyproj.CRS.from_user_input.
+
+    :returns: WKT string of the CRS.
+    """
+    # Only parse the CRS if it is not already a CRS object, as parsing is much slower than exporting to WKT
+    if not isinstance(crs, (CRS, pyproj.CRS)):
+        crs = pyproj.CRS.from_user_input(crs)
+    return str(crs.to_wkt())
+
+
+@functools.lru_cache(maxsize=150)
+def _get_transformer(in_wkt: str, out_wkt: str, always_xy: bool = False) -> pyproj.Transformer:
+    """
+    Get a pyproj Transformer between two CRSs, cached as its construction is expensive compared to most transforms.
+
+    :param in_wkt: WKT string of the input CRS.
+    :param out_wkt: WKT string of the output CRS.
+    :param always_xy: Whether to always use the x/y (lon/lat) axis order, see pyproj.Transformer.from_crs.
+
+    :returns: Transformer from input to output CRS.
+    """
+    return pyproj.Transformer.from_crs(in_wkt, out_wkt, always_xy=always_xy)
+
+
+@functools.lru_cache(maxsize=150)
+def _crs_equals(wkt1: str, wkt2: str) -> bool:
+    """
+    Check if two CRSs are equal, cached to skip reprojections between identical CRSs at almost no cost.
+
+    :param wkt1: WKT string of the first CRS.
+    :param wkt2: WKT string of the second CRS.
+
+    :returns: True if the two CRSs are equal.
+    """
+    return wkt1 == wkt2 or bool(pyproj.CRS.from_wkt(wkt1).equals(pyproj.CRS.from_wkt(wkt2)))
+
+
+def make_reproject_fn(
+    in_crs: CRS, out_crs: CRS, always_xy: bool = False
+) -> Callable[[np.ndarray, np.ndarray], tuple[np.ndarray, np.ndarray]]:
+    """
+    Make a function reprojecting coordinates from in_crs to out_crs, with the transformer bound once and for all.
+
+    This is the recommended way to reproject points repeatedly between the same CRSs, e.g. in an inner loop, as the CRS
+    comparison and transformer lookup of reproject_points are only done once.
+
+    :param in_crs: Input CRS
+    :param out_crs: Output CRS
+    :param always_xy: Whether to always use the x/y (lon/lat) axis order, otherwise the CRS axis order is used.
+
+    :returns: Function taking the x and y coordinates to reproject, and returning the reprojected x and y coordinates.
+    """
+    # If the CRSs are the same, there is nothing to reproject
+    in_wkt, out_wkt = _crs_to_wkt(in_crs), _crs_to_wkt(out_crs)
+    if _crs_equals(in_wkt, out_wkt):
+
+        def _copy(x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+            return (np.array(x, dtype=np.float64), np.array(y, dtype=np.float64))
+
+        return _copy
+
+    transform = _get_transformer(in_wkt, out_wkt, always_xy=always_xy).transform
+    direction = pyproj.enums.TransformDirection.FORWARD
+
+    def _reproject(x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        return transform(x, y, direction=direction)  # type: ignore
+
+    return _reproject
+
+
+def reproject_points(
+    pts: list[list[float]] | tuple[list[float], list[float]] | np.ndarray,
+    in_crs: CRS,
+    out_crs: CRS,
+    parallel: bool = False,
+) -> tuple[np.ndarray, np.ndarray]:
     """
     Reproject a set of point from input_crs to output_crs.
 
     :param pts: Input points to be reprojected. Must be of shape (2, N), i.e (x coords, y coords)
     :param in_crs: Input CRS
     :param out_crs: Output CRS
+    :param parallel: Whether to split the points across threads, used only for more than 100,000 points.
 
     :returns: Reprojected points, of same shape as pts.
     """
     assert np.shape(pts)[0] == 2, "pts must be of shape (2, N)"
 
-    x, y = pts
-    transformer = pyproj.Transformer.from_crs(in_crs, out_crs)
-    xout, yout = transformer.transform(x, y)
+    # Pass contiguous float arrays for pyproj to transform all points in a single call
+    pts_arr = np.ascontiguousarray(pts, dtype=np.float64)
+    reproject_fn = make_reproject_fn(in_crs, out_crs)
+
+    # The transform releases the GIL, so large sets of points can be reprojected in chunks on several threads
+    n_threads = 1
+    if parallel and pts_arr[0].size > 100_000:
+        # Use the CPUs available to this process (not all CPUs of the host, e.g. in containers) when it can be known
+        if hasattr(os, "sched_getaffinity"):
+            n_threads = len(os.sched_getaffinity(0))
+        else:
+            n_threads = os.cpu_count() or 1
+    if n_threads > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=n_threads) as executor:
+            outs = list(
+                executor.map(reproject_fn, np.array_split(pts_arr[0], n_threads), np.array_split(pts_arr[1], n_threads))
+            )
+        xout = np.concatenate([out[0] for out in outs])
+        yout = np.concatenate([out[1] for out in outs])
+    else:
+        xout, yout = reproject_fn(pts_arr[0], pts_arr[1])
+
     return (xout, yout)
 
 
@@ -219,7 +457,7 @@ crs_4326 = rio.crs.CRS.from_epsg(4326)
 
 def reproject_to_latlon(
     pts: list[list[float]] | np.ndarray, in_crs: CRS, round_: int = 8
-) -> tuple[list[float], list[float]]:
+) -> tuple[np.ndarray, np.ndarray]:
     """
     Reproject a set of point from in_crs to lat/lon.
 
@@ -229,14 +467,13 @@ def reproject_to_latlon(
 
     :returns: Reprojected points, of same shape as pts.
     """
-    proj_pts = reproject_points(pts, in_crs, crs_4326)
-    proj_pts = np.round(proj_pts, round_)
-    return proj_pts
+    xout, yout = reproject_points(pts, in_crs, crs_4326)
+    return (np.round(xout, round_), np.round(yout, round_))
 
 
 def reproject_from_latlon(
     pts: list[list[float]] | tuple[list[float], list[float]] | np.ndarray, out_crs: CRS, round_: int = 2
-) -> tuple[list[float], list[float]]:
+) -> tuple[np.ndarray, np.ndarray]:
     """
     Reproject a set of point from lat/lon to out_crs.
 
@@ -246,9 +483,8 @@ def reproject_from_latlon(
 
     :returns: Reprojected points, of same shape as pts.
     """
-    proj_pts = reproject_points(pts, crs_4326, out_crs)
-    proj_pts = np.round(proj_pts, round_)
-    return proj_pts
+    xout, yout = reproject_points(pts, crs_4326, out_crs)
+    return (np.round(xout, round_), np.round(yout, round_))
 
 
 def reproject_shape(inshape: BaseGeometry, in_crs: CRS, out_crs: CRS) -> BaseGeometry:
@@ -261,13 +497,23 @@ def reproject_shape(inshape: BaseGeometry, in_crs: CRS, out_crs: CRS) -> BaseGeo
 
     :returns: Reprojected geometry
     """
-    reproj = pyproj.Transformer.from_crs(in_crs, out_crs, always_xy=True, skip_equivalent=True).transform
-    return shapely.ops.transform(reproj, inshape)
+    # If the CRSs are the same, there is nothing to reproject
+    in_wkt, out_wkt = _crs_to_wkt(in_crs), _crs_to_wkt(out_crs)
+    if _crs_equals(in_wkt, out_wkt):
+        return inshape
+
+    transformer = _get_transformer(in_wkt, out_wkt, always_xy=True)
+
+    # Reproject all coordinates of the geometry at once, instead of through a Python callback per coordinate
+    def _reproject_coords(coords: np.ndarray) -> np.ndarray:
+        return np.column_stack(transformer.transform(*coords.T))
+
+    return shapely.transform(inshape, _reproject_coords, include_z=bool(shapely.has_z(inshape)))
 
 
 def compare_proj(proj1: CRS, proj2: CRS) -> bool:
     """
-    Compare two projections to see if they are the same, using pyproj.CRS.is_exact_same.
+    Compare two projections to see if they are the same, using pyproj.CRS.equals.
 
     :param proj1: The first projection to compare.
     :param proj2: The first projection to compare.
@@ -277,17 +523,19 @@ def compare_proj(proj1: CRS, proj2: CRS) -> bool:
     assert all(
         [isinstance(proj1, (pyproj.CRS, CRS)), isinstance(proj2, (pyproj.CRS, CRS))]
     ), "proj1 and proj2 must be rasterio.crs.CRS objects."
-    proj1 = pyproj.CRS(proj1.to_string())
-    proj2 = pyproj.CRS(proj2.to_string())
 
-    same: bool = proj1.is_exact_same(proj2)
-    return same
+    # Compare the CRSs from their WKT directly, the comparison being cached for each pair of WKT strings
+    return _crs_equals(_crs_to_wkt(proj1), _crs_to_wkt(proj2))
 
 
 def _get_bounds_projected(
     bounds: rio.coords.BoundingBox, in_crs: CRS, out_crs: CRS, densify_pts: int = 5000
 ) -> rio.coords.BoundingBox:
 
+    # If the CRSs are the same, the bounds are unchanged
+    if _crs_equals(_crs_to_wkt(in_crs), _crs_to_wkt(out_crs)):
+        return rio.coords.BoundingBox(*bounds)
+
     # Calculate new bounds
     left, bottom, right, top = bounds
     new_bounds = rio.warp.transform_bounds(in_crs, out_crs, left, bottom, right, top, densify_pts)
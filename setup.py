@@ -47,6 +47,7 @@ setup(
         "rasterio",
         "geopandas >= 0.10.0",
         "pyproj",
+        "shapely >= 2.0",
         "scipy",
         "typing-extensions; python_version < '3.8'",
         "matplotlib",
@@ -1,9 +1,13 @@
 """
 Test projtools
 """
+import geopandas as gpd
 import numpy as np
+import pyproj
 import pyproj.exceptions
 import pytest
+import rasterio as rio
+import shapely
 
 import geoutils as gu
 import geoutils.projtools as pt
@@ -37,7 +41,7 @@ class TestProjTools:
 
         # Second: check that the UTM zone is correct
         # Lower left belongs to the zone, so 0, 0 should be in zone 31N
-        assert pt.latlon_to_utm(0, 0) == "30N"
+        assert pt.latlon_to_utm(0, 0) == "31N"
         # Test extreme zones
         assert pt.latlon_to_utm(-79, -179) == "1S"
         assert pt.latlon_to_utm(79, -179) == "1N"
@@ -54,6 +58,39 @@ class TestProjTools:
         assert pt.latlon_to_utm(np.float32(0.1), np.float32(0.1))
         assert pt.latlon_to_utm(np.int16(0), np.int16(0))
 
+        # Fourth, check that the zone computed from the longitude is the same as that of the PROJ database
+        for lat, lon in [(45.3, -122.5), (-33.9, 18.4), (27.98, 86.92), (-46.5, -73.4), (0.1, 0.1)]:
+            assert pt.latlon_to_utm(lat, lon) == pt.latlon_to_utm(lat, lon, use_proj_db=True)
+        # On zone edges, the PROJ database returns the first zone containing the coordinates
+        assert pt.latlon_to_utm(0, 0, use_proj_db=True) == "30N"
+        # And outside the areas of use of UTM zones, no zone is found
+        with pytest.raises(ValueError):
+            pt.latlon_to_utm(85, 0, use_proj_db=True)
+
+    def test_latlon_to_utm_array(self) -> None:
+        """Check that the UTM zones of arrays of coordinates are the same as those of each coordinate"""
+
+        # Errors are raised when format is invalid or values are outside limits
+        with pytest.raises(TypeError):
+            pt.latlon_to_utm_array(np.array(["1"]), np.array([100]))
+        with pytest.raises(ValueError):
+            pt.latlon_to_utm_array(np.array([0, 91]), np.array([0, 0]))
+        with pytest.raises(ValueError):
+            pt.latlon_to_utm_array(np.array([0, 0]), np.array([0, -181]))
+        # Including NaNs
+        with pytest.raises(ValueError):
+            pt.latlon_to_utm_array(np.array([np.nan]), np.array([0.0]))
+        with pytest.raises(ValueError):
+            pt.latlon_to_utm_array(np.array([0.0]), np.array([np.nan]))
+
+        rng = np.random.default_rng(42)
+        lats = np.concatenate(([0, -79, 79, -79, 79, 1, 1, -1, -1], rng.uniform(-90, 90, 100)))
+        lons = np.concatenate(([0, -179, -179, 179, 179, -59, 61, -121, 119], rng.uniform(-180, 180, 100)))
+
+        zones = pt.latlon_to_utm_array(lats, lons)
+        assert zones.shape == lats.shape
+        assert list(zones) == [pt.latlon_to_utm(lat, lon) for lat, lon in zip(lats, lons)]
+
     def test_utm_to_epsg(self) -> None:
         """Check that the EPSG codes derived from UTM zones are correct"""
 
@@ -105,6 +142,125 @@ class TestProjTools:
         assert np.all(x == randx)
         assert np.all(y == randy)
 
+    def test_reproject_points_parallel(self) -> None:
+        """Check that reprojecting points on several threads gives the same result as on a single thread"""
+
+        img = gu.Raster(self.landsat_b4_path)
+
+        nsample = 200000
+        randx = np.random.uniform(low=img.bounds.left, high=img.bounds.right, size=(nsample,))
+        randy = np.random.uniform(low=img.bounds.bottom, high=img.bounds.top, size=(nsample,))
+
+        lat, lon = pt.reproject_points([randx, randy], img.crs, pt.crs_4326)
+        lat2, lon2 = pt.reproject_points([randx, randy], img.crs, pt.crs_4326, parallel=True)
+
+        assert np.array_equal(lat, lat2)
+        assert np.array_equal(lon, lon2)
+
+    def test_align_bounds(self) -> None:
+        """Check that align_bounds and align_bounds_batch pad the bounds to the reference pixel grid"""
+
+        img = gu.Raster(self.landsat_b4_path)
+        left, bottom, right, top = img.bounds
+        xres, yres = img.res
+
+        # Bounds already on the grid are unchanged, others are padded to the next pixel edges
+        assert pt.align_bounds(img.transform, img.bounds) == tuple(img.bounds)
+        aligned = pt.align_bounds(img.transform, (left + xres / 3, bottom + yres / 3, right - xres / 3, top - yres / 3))
+        assert aligned == tuple(img.bounds)
+        aligned = pt.align_bounds(img.transform, (left - xres / 3, bottom - yres / 3, right + xres / 3, top + yres / 3))
+        assert aligned == (left - xres, bottom - yres, right + xres, top + yres)
+
+        # The batch version gives the same result as aligning bounds one by one
+        src_bounds = np.array(
+            [
+                [left + 10.3, bottom + 1.7, right - 20.1, top - 45.2],
+                [left - 10.3, bottom - 1.7, right + 20.1, top + 45.2],
+                [left + 1000, bottom + 1000, left + 2000.5, bottom + 3000.5],
+            ]
+        )
+        batch_aligned = pt.align_bounds_batch(img.transform, src_bounds)
+        assert batch_aligned.shape == (3, 4)
+        for i in range(3):
+            assert np.array_equal(batch_aligned[i], pt.align_bounds(img.transform, src_bounds[i]))
+
+    def test_make_reproject_fn(self) -> None:
+        """Check that the reprojection function gives the same results as reproject_points"""
+
+        img = gu.Raster(self.landsat_b4_path)
+        x = np.linspace(img.bounds.left, img.bounds.right, 50)
+        y = np.linspace(img.bounds.bottom, img.bounds.top, 50)
+
+        reproject_fn = pt.make_reproject_fn(img.crs, pt.crs_4326)
+        lat, lon = reproject_fn(x, y)
+        lat2, lon2 = pt.reproject_points([x, y], img.crs, pt.crs_4326)
+        assert np.array_equal(lat, lat2) and np.array_equal(lon, lon2)
+
+        # With x/y axis order, the longitude comes first
+        lon3, lat3 = pt.make_reproject_fn(img.crs, pt.crs_4326, always_xy=True)(x, y)
+        assert np.array_equal(lat, lat3) and np.array_equal(lon, lon3)
+
+    def test_get_transformer(self) -> None:
+        """Check that transformers are cached per CRS pair"""
+
+        img = gu.Raster(self.landsat_b4_path)
+
+        pt._get_transformer.cache_clear()
+        transformer = pt._get_transformer(pt._crs_to_wkt(img.crs), pt._crs_to_wkt(pt.crs_4326))
+
+        # The same CRS pair, even from other CRS objects, should reuse the cached transformer
+        in_wkt = pt._crs_to_wkt(rio.crs.CRS.from_wkt(img.crs.to_wkt()))
+        out_wkt = pt._crs_to_wkt(rio.crs.CRS.from_epsg(4326))
+        assert pt._get_transformer(in_wkt, out_wkt) is transformer
+        assert pt._get_transformer.cache_info().hits == 1
+
+        # While a different axis order is a different transformer
+        assert pt._get_transformer(in_wkt, out_wkt, always_xy=True) is not transformer
+
+    def test_reproject_same_crs(self) -> None:
+        """Check that reprojecting into the same CRS returns the inputs unchanged, without building a transformer"""
+
+        img = gu.Raster(self.landsat_b4_path)
+        pt._get_transformer.cache_clear()
+
+        pts = np.array([[img.bounds.left, img.bounds.right], [img.bounds.bottom, img.bounds.top]])
+        x, y = pt.reproject_points(pts, img.crs, pyproj.CRS(img.crs))
+        assert np.array_equal(x, pts[0]) and np.array_equal(y, pts[1])
+
+        shape = pt.bounds2poly(img)
+        assert pt.reproject_shape(shape, img.crs, img.crs) is shape
+
+        assert pt._get_bounds_projected(img.bounds, img.crs, img.crs) == img.bounds
+
+        assert pt._get_transformer.cache_info().currsize == 0
+
+    def test_reproject_shape(self) -> None:
+        """Check that shapes are reprojected as with geopandas, reusing the same cached transformer"""
+
+        img = gu.Raster(self.landsat_b4_path)
+        outlines = gu.Vector(gu.examples.get_path("everest_rgi_outlines"))
+        pt._get_transformer.cache_clear()
+
+        for shape in outlines.ds.geometry:
+            reproj_shape = pt.reproject_shape(shape, outlines.crs, img.crs)
+            expected_shape = gpd.GeoSeries([shape], crs=outlines.crs).to_crs(img.crs).iloc[0]
+            assert reproj_shape.equals_exact(expected_shape, tolerance=1e-6)
+        assert pt._get_transformer.cache_info().currsize == 1
+
+        # Z coordinates are preserved
+        point = pt.reproject_shape(shapely.Point(86.9, 27.9, 5000), pt.crs_4326, img.crs)
+        assert point.has_z and point.z == 5000
+
+    def test_compare_proj(self) -> None:
+        """Check that projections are compared correctly between rasterio and pyproj CRSs"""
+
+        img = gu.Raster(self.landsat_b4_path)
+
+        assert pt.compare_proj(img.crs, img.crs)
+        assert pt.compare_proj(img.crs, pyproj.CRS.from_epsg(32645))
+        assert pt.compare_proj(pt.crs_4326, pyproj.CRS.from_epsg(4326))
+        assert not pt.compare_proj(img.crs, pt.crs_4326)
+
     def test_merge_bounds(self) -> None:
         """
         Check that merge_bounds and bounds2poly work as expected for all kinds of bounds objects.
@@ -143,3 +299,41 @@ class TestProjTools:
         assert out_bounds[1] == min(img1.bounds.bottom, outlines.ds.total_bounds[1])
         assert out_bounds[2] == max(img1.bounds.right, outlines.ds.total_bounds[2])
         assert out_bounds[3] == max(img1.bounds.top, outlines.ds.total_bounds[3])
+
+        # Check that the results is the same with a rasterio dataset and a geopandas GeoSeries
+        with rio.open(self.landsat_b4_path) as ds:
+            assert pt.merge_bounds((ds, outlines.ds.geometry)) == out_bounds
+
+        # Check that a void intersection returns NaNs
+        out_bounds = pt.merge_bounds(((0, 0, 1, 1), (2, 2, 3, 3)), merging_algorithm="intersection")
+        assert all(np.isnan(b) for b in out_bounds)
+
+        # Check that inverted bounds (e.g., bottom > top for a south-up raster) are merged as their polygon
+        out_bounds = pt.merge_bounds(
+            (rio.coords.BoundingBox(0, 1, 1, 0), (0, 0, 2, 2)), merging_algorithm="intersection"
+        )
+        assert out_bounds == (0, 0, 1, 1)
+        assert pt.merge_bounds((rio.coords.BoundingBox(1, 1, 0, 0),)) == (0, 0, 1, 1)
+
+        # Check that a wrong merging algorithm raises an error
+        with pytest.raises(ValueError):
+            pt.merge_bounds((img1, img2), merging_algorithm="difference")
+
+        # Check that bounds2poly reprojects the bounds into an envelope that contains the reprojected corners
+        poly = pt.bounds2poly(img1, out_crs=pt.crs_4326)
+        xs, ys = pt.reproject_shape(pt.bounds2poly(img1), img1.crs, pt.crs_4326).exterior.xy
+        assert poly.bounds[0] <= min(xs) and poly.bounds[2] >= max(xs)
+        assert poly.bounds[1] <= min(ys) and poly.bounds[3] >= max(ys)
+
+        # Check that the bounds are the same as those of the union/intersection of the polygons of each bounds
+        rng = np.random.default_rng(42)
+        mins = rng.uniform(0, 5, size=(10, 2))
+        random_bounds_arr = np.hstack((mins, mins + rng.uniform(5, 10, size=(10, 2))))
+        # Invert some of the bounds (left > right or bottom > top), which should have the same polygon
+        random_bounds_arr[:3] = random_bounds_arr[:3, [2, 1, 0, 3]]
+        random_bounds_arr[3:6] = random_bounds_arr[3:6, [0, 3, 2, 1]]
+        random_bounds = [tuple(b) for b in random_bounds_arr]
+        polys = [pt.bounds2poly(b) for b in random_bounds]
+        assert pt.merge_bounds(random_bounds) == shapely.unary_union(polys).bounds
+        intersection_bounds = pt.merge_bounds(random_bounds, merging_algorithm="intersection")
+        assert intersection_bounds == shapely.intersection_all(polys).bounds